@@ -1,7 +1,6 @@
-import json
-import datetime
 import os
 from mcp.server.fastmcp import FastMCP
+from mcp_utils import dumps, ts
 
 # Get port from environment variable (Railway/Render sets this, defaults to 8001 for local dev)
 PORT = int(os.environ.get("PORT", 8001))
@@ -21,12 +20,12 @@ def ping() -> str:
         response = {
             "status": "ok",
             "message": "Oui le serveur marche",
-            "timestamp": datetime.datetime.now().isoformat(),
+            "timestamp": ts(),
             "server": "Generic MCP Server"
         }
-        return json.dumps(response, indent=2)
+        return dumps(response)
     except Exception as e:
-        return json.dumps({"error": f"An error occurred: {str(e)}"})
+        return dumps({"error": f"An error occurred: {str(e)}"})
 
 if __name__ == "__main__":
     # Run the server with SSE transport
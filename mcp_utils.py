@@ -0,0 +1,28 @@
+import json
+import time
+
+try:
+    import orjson
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    def dumpb(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    loads = orjson.loads
+except ImportError:
+    # Fall back to the stdlib encoder when orjson is not installed
+    # ensure_ascii=False emits UTF-8 like orjson, instead of 6-byte \uXXXX escapes
+    def dumps(obj) -> str:
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+    def dumpb(obj) -> bytes:
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
+    loads = json.loads
+
+
+def ts() -> str:
+    """Current UTC time as an ISO 8601 string with second precision"""
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
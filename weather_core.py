@@ -0,0 +1,116 @@
+import asyncio
+import httpx
+import os
+import threading
+import time
+from typing import Dict
+from mcp_utils import loads
+
+# Maps spaces and path separators to underscores when building history file names
+_SLUG = str.maketrans({' ': '_', '/': '_', '\\': '_'})
+
+# Shared async HTTP client so the TCP/TLS connection to wttr.in is reused across tool calls
+_CLIENT = httpx.AsyncClient(
+    timeout=httpx.Timeout(10.0, connect=3.0),
+    follow_redirects=True,
+    headers={"Accept-Encoding": "gzip"},
+    transport=httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=2,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=8)
+    )
+)
+
+# Parsed wttr.in responses keyed by lowercased location:
+# {key: (expires_at, data, etag, last_modified)}. Stale entries are kept so
+# they can be revalidated with a conditional GET.
+WTTR_CACHE_TTL = 300
+WTTR_CACHE_MAXSIZE = 256
+_wttr_cache: Dict[str, tuple] = {}
+_wttr_cache_lock = threading.Lock()
+
+# Top-level j1 keys the tools read; hourly forecasts, astronomy, etc. are not kept in the cache
+_WTTR_KEEP = ('current_condition',)
+
+# wttr.in gateway errors are retried WTTR_RETRIES times with 0.2 * 2**n seconds of backoff
+WTTR_RETRIES = 2
+_RETRY_STATUSES = frozenset((502, 503, 504))
+
+# Caps concurrent wttr.in requests, e.g. when a batch fans out over many locations
+_WTTR_SEMAPHORE = asyncio.Semaphore(8)
+
+
+async def fetch_wttr(location: str) -> dict:
+    """Fetch the wttr.in JSON for a location trimmed to the _WTTR_KEEP keys, served from cache while fresh"""
+    key = location.lower()
+    now = time.monotonic()
+
+    with _wttr_cache_lock:
+        entry = _wttr_cache.get(key)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    # Using wttr.in - a free weather API that requires no API key
+    url = f"https://wttr.in/{location}?format=j1"
+
+    # Revalidate a stale entry so an unchanged body comes back as an empty 304
+    headers = {}
+    if entry is not None:
+        if entry[2]:
+            headers['If-None-Match'] = entry[2]
+        if entry[3]:
+            headers['If-Modified-Since'] = entry[3]
+
+    for attempt in range(WTTR_RETRIES + 1):
+        # Only hold a semaphore slot for the request itself, not the backoff
+        async with _WTTR_SEMAPHORE:
+            response = await _CLIENT.get(url, headers=headers)
+        if response.status_code not in _RETRY_STATUSES or attempt == WTTR_RETRIES:
+            break
+        await asyncio.sleep(0.2 * 2 ** attempt)
+
+    if response.status_code == 304 and entry is not None:
+        weather_data, etag, last_modified = entry[1], entry[2], entry[3]
+    else:
+        response.raise_for_status()
+        payload = loads(response.content)
+        weather_data = {k: payload[k] for k in _WTTR_KEEP if k in payload}
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+
+    with _wttr_cache_lock:
+        _wttr_cache.pop(key, None)
+        # Drop expired entries first, then the oldest ones if still full
+        if len(_wttr_cache) >= WTTR_CACHE_MAXSIZE:
+            for k in [k for k, cached in _wttr_cache.items() if cached[0] <= now]:
+                del _wttr_cache[k]
+            while len(_wttr_cache) >= WTTR_CACHE_MAXSIZE:
+                del _wttr_cache[next(iter(_wttr_cache))]
+        _wttr_cache[key] = (now + WTTR_CACHE_TTL, weather_data, etag, last_modified)
+
+    return weather_data
+
+
+def nested(d: dict, key: str, sub: str):
+    """Return d[key][0][sub], or 'N/A' when any level is missing"""
+    lst = d.get(key)
+    return lst[0].get(sub, 'N/A') if lst else 'N/A'
+
+
+def slug(location: str) -> str:
+    """Normalize a location into a file name that stays inside the weather directory"""
+    name = location.lower().translate(_SLUG)
+    if '..' in name or name.startswith('.'):
+        raise ValueError(f"Invalid location name: {location!r}")
+    return name
+
+
+def atomic_write(path: str, data: bytes):
+    """Write data to path via a temp file and os.replace so readers never see a partial file"""
+    tmp = path + '.tmp'
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+    os.replace(tmp, path)
@@ -1,10 +1,32 @@
-import requests
-import json
+import asyncio
+import httpx
 import os
+import struct
+import threading
+from datetime import datetime, timezone
 from typing import List, Dict
 from mcp.server.fastmcp import FastMCP
+from mcp_utils import dumps, dumpb, loads, ts
+from weather_core import fetch_wttr, nested, slug, atomic_write
 
 WEATHER_DIR = "weather"
+HISTORY_SUFFIX = "_history.dat"
+# Whole-file JSON history written by earlier versions, imported on first save
+LEGACY_HISTORY_SUFFIX = "_history.json"
+
+# History files are ring buffers: a 4-byte little-endian write head followed by
+# up to HISTORY_MAX_ENTRIES fixed-size slots, each holding one NUL-padded JSON
+# entry. Files grow one slot per save and only wrap around once full.
+HISTORY_MAX_ENTRIES = 100
+HISTORY_SLOT_SIZE = 512
+_HEAD = struct.Struct('<I')
+_history_lock = threading.Lock()
+
+# Most distinct locations accepted by get_current_weather_batch in one call
+MAX_BATCH = 20
+
+# Set once WEATHER_DIR is known to exist, so later saves skip the stat call
+_dir_ready = False
 
 # Get port from environment variable (Render sets this, defaults to 8001 for local dev)
 PORT = int(os.environ.get("PORT", 8001))
@@ -21,19 +43,39 @@ def ping() -> str:
         JSON string confirming the server is working
     """
     try:
-        import datetime
         response = {
             "status": "ok",
             "message": "Oui le serveur marche",
-            "timestamp": datetime.datetime.now().isoformat(),
+            "timestamp": ts(),
             "server": "Generic MCP Server"
         }
-        return json.dumps(response, indent=2)
+        return dumps(response)
     except Exception as e:
-        return json.dumps({"error": f"An error occurred: {str(e)}"})
+        return dumps({"error": f"An error occurred: {str(e)}"})
+
+
+def _current_weather_info(location: str, weather_data: dict) -> dict:
+    """Extract the current conditions returned to clients from a wttr.in payload"""
+    # Extract current conditions
+    conditions = weather_data.get('current_condition')
+    current = conditions[0] if conditions else {}
+    g = current.get
+    
+    return {
+        'location': location,
+        'temperature_c': g('temp_C', 'N/A'),
+        'temperature_f': g('temp_F', 'N/A'),
+        'condition': nested(current, 'weatherDesc', 'value'),
+        'humidity': g('humidity', 'N/A'),
+        'wind_speed_kmh': g('windspeedKmph', 'N/A'),
+        'wind_direction': g('winddir16Point', 'N/A'),
+        'feels_like_c': g('FeelsLikeC', 'N/A'),
+        'feels_like_f': g('FeelsLikeF', 'N/A')
+    }
+
 
 @mcp.tool()
-def get_current_weather(location: str) -> str:
+async def get_current_weather(location: str) -> str:
     """
     Get current weather information for a specific location.
 
@@ -44,72 +86,172 @@ def get_current_weather(location: str) -> str:
         JSON string with current weather information
     """
     try:
-        # Using wttr.in - a free weather API that requires no API key
-        url = f"https://wttr.in/{location}?format=j1"
+        weather_data = await fetch_wttr(location)
+        weather_info = _current_weather_info(location, weather_data)
         
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
+        # Save weather data
+        await asyncio.to_thread(save_weather_data, location, weather_info)
         
-        weather_data = response.json()
+        return dumps(weather_info)
         
-        # Extract current conditions
-        current = weather_data.get('current_condition', [{}])[0]
+    except httpx.HTTPError as e:
+        return dumps({'error': f'Failed to fetch weather data: {str(e)}'})
+    except Exception as e:
+        return dumps({'error': f'An error occurred: {str(e)}'})
+
+
+@mcp.tool()
+async def get_current_weather_batch(locations: List[str]) -> str:
+    """
+    Get current weather information for several locations in one call.
+
+    Args:
+        locations: The city names or locations to get weather for (at most MAX_BATCH distinct ones)
+
+    Returns:
+        JSON string with a list of current weather entries, one per distinct location
+    """
+    try:
+        # Drop case-insensitive duplicates, keeping the first spelling and the original order
+        seen = set()
+        unique = []
+        for location in locations:
+            key = location.lower()
+            if key not in seen:
+                seen.add(key)
+                unique.append(location)
+        locations = unique
+        if len(locations) > MAX_BATCH:
+            return dumps({'error': f'Too many locations: {len(locations)} given, at most {MAX_BATCH} allowed'})
         
-        weather_info = {
-            'location': location,
-            'temperature_c': current.get('temp_C', 'N/A'),
-            'temperature_f': current.get('temp_F', 'N/A'),
-            'condition': current.get('weatherDesc', [{}])[0].get('value', 'N/A'),
-            'humidity': current.get('humidity', 'N/A'),
-            'wind_speed_kmh': current.get('windspeedKmph', 'N/A'),
-            'wind_direction': current.get('winddir16Point', 'N/A'),
-            'feels_like_c': current.get('FeelsLikeC', 'N/A'),
-            'feels_like_f': current.get('FeelsLikeF', 'N/A')
-        }
+        results = await asyncio.gather(
+            *[fetch_wttr(location) for location in locations],
+            return_exceptions=True
+        )
         
-        # Save weather data
-        save_weather_data(location, weather_info)
+        batch = []
+        to_save = []
+        for location, weather_data in zip(locations, results):
+            if isinstance(weather_data, Exception):
+                batch.append({'location': location, 'error': f'Failed to fetch weather data: {str(weather_data)}'})
+                continue
+            weather_info = _current_weather_info(location, weather_data)
+            to_save.append((location, weather_info))
+            batch.append(weather_info)
         
-        return json.dumps(weather_info, indent=2)
+        # Save every entry in one worker thread hop
+        await asyncio.to_thread(_save_weather_batch, to_save)
+        
+        return dumps(batch)
         
-    except requests.RequestException as e:
-        return json.dumps({'error': f'Failed to fetch weather data: {str(e)}'})
     except Exception as e:
-        return json.dumps({'error': f'An error occurred: {str(e)}'})
+        return dumps({'error': f'An error occurred: {str(e)}'})
+
+
+def _encode_history_record(weather_data: dict) -> bytes:
+    """Encode one history entry as a NUL-padded slot"""
+    # The file name already identifies the location, so records leave it out
+    record = dumpb({k: v for k, v in weather_data.items() if k != 'location'}) + b'\n'
+    if len(record) > HISTORY_SLOT_SIZE:
+        raise ValueError(f"Entry is {len(record)} bytes, larger than a {HISTORY_SLOT_SIZE}-byte history slot")
+    return record.ljust(HISTORY_SLOT_SIZE, b'\0')
+
+
+def _read_history(path: str) -> List[dict]:
+    """Decode a ring buffer history file into its entries, oldest first"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+    
+    head = _HEAD.unpack_from(data)[0] % HISTORY_MAX_ENTRIES
+    count = min((len(data) - _HEAD.size) // HISTORY_SLOT_SIZE, HISTORY_MAX_ENTRIES)
+    slots = [
+        data[_HEAD.size + i * HISTORY_SLOT_SIZE:_HEAD.size + (i + 1) * HISTORY_SLOT_SIZE]
+        for i in range(count)
+    ]
+    # Until the file is full, slots are in write order; once it wraps, the oldest is at the head
+    if count == HISTORY_MAX_ENTRIES:
+        slots = slots[head:] + slots[:head]
+    
+    return [loads(slot.rstrip(b'\0')) for slot in slots if slot.strip(b'\0')]
+
+
+def _utc_timestamp(value: str) -> str:
+    """Convert a legacy naive local-time isoformat() timestamp to the UTC '...Z' form used by ts()"""
+    try:
+        return datetime.fromisoformat(value).astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    except (TypeError, ValueError):
+        return value
+
+
+def _new_history_file(history_file: str, legacy_file: str):
+    """Create a ring buffer history file, seeded with the legacy JSON history if one exists"""
+    try:
+        with open(legacy_file, 'rb') as f:
+            entries = loads(f.read()).get('entries', [])
+    except (OSError, ValueError, AttributeError):
+        # A missing, truncated or malformed legacy file must never block new history
+        entries = []
+    if not isinstance(entries, list):
+        entries = []
+    
+    slots = []
+    for entry in entries[-HISTORY_MAX_ENTRIES:]:
+        if not isinstance(entry, dict):
+            continue
+        if 'timestamp' in entry:
+            entry = dict(entry, timestamp=_utc_timestamp(entry['timestamp']))
+        try:
+            slots.append(_encode_history_record(entry))
+        except ValueError:
+            continue
+    # The legacy file is left in place; it is only read when the ring file is missing
+    atomic_write(history_file, _HEAD.pack(len(slots) % HISTORY_MAX_ENTRIES) + b''.join(slots))
 
 
 def save_weather_data(location: str, weather_data: dict):
     """Save weather data to local storage"""
+    global _dir_ready
     try:
-        if not os.path.exists(WEATHER_DIR):
-            os.makedirs(WEATHER_DIR)
+        if not _dir_ready:
+            os.makedirs(WEATHER_DIR, exist_ok=True)
+            _dir_ready = True
         
-        history_file = os.path.join(WEATHER_DIR, f"{location.lower().replace(' ', '_')}_history.json")
-        
-        # Load existing history or create new
-        if os.path.exists(history_file):
-            with open(history_file, 'r') as f:
-                history = json.load(f)
-        else:
-            history = {'location': location, 'entries': []}
+        base = os.path.join(WEATHER_DIR, slug(location))
+        history_file = base + HISTORY_SUFFIX
         
         # Add timestamp to weather data
-        import datetime
-        weather_data['timestamp'] = datetime.datetime.now().isoformat()
-        
-        # Add new entry to history
-        history['entries'].append(weather_data)
+        weather_data['timestamp'] = ts()
         
-        # Keep only last 100 entries
-        history['entries'] = history['entries'][-100:]
+        slot = _encode_history_record(weather_data)
         
-        # Save updated history
-        with open(history_file, 'w') as f:
-            json.dump(history, f, indent=2)
+        with _history_lock:
+            try:
+                f = open(history_file, 'r+b')
+            except FileNotFoundError:
+                # Start with just the write head (plus any legacy entries); slots are appended as entries arrive
+                _new_history_file(history_file, base + LEGACY_HISTORY_SUFFIX)
+                f = open(history_file, 'r+b')
+            
+            # Fill the next slot (overwriting the oldest once full), then advance the write head
+            with f:
+                head = _HEAD.unpack(f.read(_HEAD.size))[0] % HISTORY_MAX_ENTRIES
+                f.seek(_HEAD.size + head * HISTORY_SLOT_SIZE)
+                f.write(slot)
+                f.seek(0)
+                f.write(_HEAD.pack((head + 1) % HISTORY_MAX_ENTRIES))
             
     except Exception as e:
         print(f"Failed to save weather data: {e}")
 
+
+def _save_weather_batch(entries: List[tuple]):
+    """Save several (location, weather_data) pairs from a single worker thread"""
+    for location, weather_data in entries:
+        save_weather_data(location, weather_data)
+
 if __name__ == "__main__":
     # Run the server with SSE transport
     mcp.run(transport="sse")
\ No newline at end of file